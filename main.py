@@ -4,6 +4,7 @@
 # https://pypi.org/project/blessed/
 from blessed import Terminal
 from enum import Enum
+import sys
 
 
 # Enum representing the two piece colors, white and black
@@ -22,12 +23,25 @@ class State(Enum):
 
 # Get an instance of the terminal, provided by the Blessed module
 term = Terminal()
+# Output queued by echo that has not yet been printed to the console
+output_buffer = []
 
 # The dimensions of the board, used for accurately drawing to the terminal
 BOARD_HEIGHT = 8
 BOARD_WIDTH = 8
 BOARD_MARGIN = 1
 
+
+# Checks if the sum of two numbers, usually coordinate positions, is an odd number
+def is_sum_odd(x, y):
+    return (x + y) % 2 == 1
+
+
+# The coordinates of every white square on the board, which are the only squares pieces can occupy
+# This comprehension is based on a StackOverflow solution:
+# https://stackoverflow.com/questions/3633140/nested-for-loops-using-list-comprehension
+WHITE_SQUARES = tuple((x, y) for x in range(BOARD_WIDTH) for y in range(BOARD_HEIGHT) if is_sum_odd(x, y))
+
 # The coordinates of the currently selected square
 selected_square = (0, 0)
 
@@ -49,10 +63,27 @@ square_bg_highlighted_g = term.black_on_green3
 # dimmed square background color
 square_bg_dimmed = term.black_on_gray
 
+# The background color of each square in the regular checkerboard pattern, before anything is highlighted
+base_cell_bg = [[square_bg_gray] * BOARD_HEIGHT for _ in range(BOARD_WIDTH)]
+for white_x, white_y in WHITE_SQUARES:
+    base_cell_bg[white_x][white_y] = square_bg_white
+# The background color of each square on the main menu, where all of the white squares are dimmed
+main_menu_cell_bg = [[square_bg_gray] * BOARD_HEIGHT for _ in range(BOARD_WIDTH)]
+for white_x, white_y in WHITE_SQUARES:
+    main_menu_cell_bg[white_x][white_y] = square_bg_dimmed
+
 
 # A class representing a game piece, with properties for its position, team, whether it's a king, whether it's currently
 # in a jump chain, and lists of the possible actions it can take
 class Piece:
+    # The directions each kind of piece is able to move in
+    _KING_DIRS = ((-1, -1), (1, -1), (1, 1), (-1, 1))
+    _BLACK_DIRS = ((-1, -1), (1, -1))
+    _WHITE_DIRS = ((-1, 1), (1, 1))
+
+    # Pieces only ever have these attributes, so they are stored in fixed slots rather than a per-instance dict
+    __slots__ = ('pos', 'team', 'in_jump_chain', 'is_king', 'possible_moves', 'possible_jumps')
+
     def __init__(self, pos, team):
         self.pos = pos
         self.team = team
@@ -62,15 +93,18 @@ class Piece:
         self.possible_moves = []
         # The jumps available to a piece
         self.possible_jumps = []
+        board[pos[0]][pos[1]] = self
+        team_pieces[team].append(self)
+        team_bitboards[team] |= get_square_bit(pos)
 
     # Get the list of directions that might be available based on the piece's team and whether it's a king
     def get_directions(self):
         if self.is_king:
-            return (-1, -1), (1, -1), (1, 1), (-1, 1)
+            return Piece._KING_DIRS
         if self.team == Team.BLACK:
-            return (-1, -1), (1, -1)
+            return Piece._BLACK_DIRS
         else:
-            return (-1, 1), (1, 1)
+            return Piece._WHITE_DIRS
 
     # Update the actions available to the piece
     def reset_possible_actions(self):
@@ -83,18 +117,21 @@ class Piece:
         self.possible_moves = []
         self.possible_jumps = []
 
+        # Occupancy is checked with bitwise operations on the teams' bitboards rather than by looking up pieces
+        opponent_squares = team_bitboards[Team.BLACK if self.team == Team.WHITE else Team.WHITE]
+        occupied_squares = team_bitboards[self.team] | opponent_squares
+
+        # The neighbor table only contains directions that stay on the board, so coordinates don't need to be checked
+        neighbors = square_neighbors[self.pos[0]][self.pos[1]]
         for direction in self.get_directions():
-            target = (self.pos[0] + direction[0], self.pos[1] + direction[1])
-            double_target = (self.pos[0] + 2 * direction[0], self.pos[1] + 2 * direction[1])
-            if not (0 <= target[0] < BOARD_WIDTH and 0 <= target[1] < BOARD_HEIGHT):
+            if direction not in neighbors:
                 continue
 
-            piece_at_target = get_piece_at(target, pieces)
-            piece_at_double_target = get_piece_at(double_target, pieces)
-            if piece_at_target is None:
+            target_bit, double_target_bit = neighbors[direction]
+            if not occupied_squares & target_bit:
                 self.possible_moves.append(direction)
-            elif piece_at_target.team != self.team and piece_at_double_target is None:
-                if 0 <= double_target[0] < BOARD_WIDTH and 0 <= double_target[1] < BOARD_HEIGHT:
+            elif opponent_squares & target_bit:
+                if double_target_bit is not None and not occupied_squares & double_target_bit:
                     self.possible_jumps.append(direction)
 
         # Clear the list of possible moves if there are any jumps available
@@ -109,43 +146,115 @@ class Piece:
             return '○' if self.team == Team.WHITE else '●'
 
 
-# Print to the console at a certain coordinate
-def echo(val, x, y, flush=True, add_margin=True):
-    with(term.location(x, y + (BOARD_MARGIN if add_margin else 0))):
-        print(val, end='', flush=flush)
+# Queue output to be printed to the console at a certain coordinate the next time the output is flushed
+def echo(val, x, y, add_margin=True):
+    # Every write positions the cursor absolutely, so there is no need to save and restore its position
+    output_buffer.append(term.move_xy(x, y + (BOARD_MARGIN if add_margin else 0)) + val)
 
 
-# Get the piece at a certain coordinate position, or return None if the coordinate is empty
-def get_piece_at(coords, piece_list):
-    for piece in piece_list:
-        if piece.pos == coords:
-            return piece
+# Print all of the queued output to the console with a single write
+def flush_output():
+    sys.stdout.write(''.join(output_buffer))
+    sys.stdout.flush()
+    output_buffer.clear()
+
+
+# Get the piece at a certain coordinate position, or return None if the coordinate is empty or off the board
+def get_piece_at(coords):
+    if 0 <= coords[0] < BOARD_WIDTH and 0 <= coords[1] < BOARD_HEIGHT:
+        return board[coords[0]][coords[1]]
     return None
 
 
+# Get the bit that represents a certain coordinate position on a bitboard
+def get_square_bit(coords):
+    return 1 << (coords[0] + BOARD_WIDTH * coords[1])
+
+
+# Build a grid containing, for every square, a dictionary of the squares next to it in each direction
+# Key: a direction whose adjacent square is on the board
+# Value: the bits of the squares one and two steps away in that direction
+# The second bit is None if that square is off the board
+def build_square_neighbors():
+    neighbor_grid = [[{} for _ in range(BOARD_HEIGHT)] for _ in range(BOARD_WIDTH)]
+    for x in range(BOARD_WIDTH):
+        for y in range(BOARD_HEIGHT):
+            for direction in Piece._KING_DIRS:
+                target = (x + direction[0], y + direction[1])
+                double_target = (x + 2 * direction[0], y + 2 * direction[1])
+                if not (0 <= target[0] < BOARD_WIDTH and 0 <= target[1] < BOARD_HEIGHT):
+                    continue
+
+                double_target_bit = None
+                if 0 <= double_target[0] < BOARD_WIDTH and 0 <= double_target[1] < BOARD_HEIGHT:
+                    double_target_bit = get_square_bit(double_target)
+                neighbor_grid[x][y][direction] = (get_square_bit(target), double_target_bit)
+    return neighbor_grid
+
+
+# Move a piece to a new coordinate position, keeping the board grid and bitboards in sync
+def move_piece(piece, new_pos):
+    board[piece.pos[0]][piece.pos[1]] = None
+    team_bitboards[piece.team] ^= get_square_bit(piece.pos) | get_square_bit(new_pos)
+    piece.pos = new_pos
+    board[new_pos[0]][new_pos[1]] = piece
+
+
+# Remove a piece that has been jumped over from play
+def capture_piece(piece):
+    board[piece.pos[0]][piece.pos[1]] = None
+    team_bitboards[piece.team] &= ~get_square_bit(piece.pos)
+    pieces.remove(piece)
+    team_pieces[piece.team].remove(piece)
+
+
+# Mark whether a piece is in a jump chain, clearing the cached jump pieces since they depend on it
+def set_in_jump_chain(piece, in_jump_chain):
+    piece.in_jump_chain = in_jump_chain
+    jump_pieces_cache.clear()
+
+
 # Reset the possible actions of all the pieces on the board
 def reset_piece_actions():
     for piece in pieces:
         piece.reset_possible_actions()
+    jump_pieces_cache.clear()
+
+
+# Reset the possible actions of only the pieces that could be affected by changes to the specified squares
+# A piece only looks up to two squares away in any direction, so pieces further than that can be skipped
+def reset_piece_actions_near(squares):
+    dirty_squares = set()
+    for square in squares:
+        for dx in range(-2, 3):
+            for dy in range(-2, 3):
+                dirty_squares.add((square[0] + dx, square[1] + dy))
+
+    for piece in pieces:
+        if piece.pos in dirty_squares:
+            piece.reset_possible_actions()
+    jump_pieces_cache.clear()
 
 
 # Get the list of all the pieces belonging to a specified team
 def get_team_pieces(team):
-    team_pieces = []
-    for piece in pieces:
-        if piece.team == team:
-            team_pieces.append(piece)
-    return team_pieces
+    return team_pieces[team]
 
 
 # Get a list of pieces on a specified team that have jumps available (and are thus required to jump)
+# The result is cached until the pieces' actions are reset or a jump chain starts or ends
 def get_jump_pieces(team):
+    if team in jump_pieces_cache:
+        return jump_pieces_cache[team]
+
     jump_pieces = []
     for piece in get_team_pieces(team):
         if piece.in_jump_chain:
-            return [piece]
+            jump_pieces = [piece]
+            break
         elif len(piece.possible_jumps) > 0:
             jump_pieces.append(piece)
+    jump_pieces_cache[team] = jump_pieces
     return jump_pieces
 
 
@@ -162,11 +271,6 @@ def get_available_pieces(team):
     return available_pieces
 
 
-# Checks if the sum of two numbers, usually coordinate positions, is an odd number
-def is_sum_odd(x, y):
-    return (x + y) % 2 == 1
-
-
 # At the start of the game, draw a border around the board
 def draw_border(width, height):
     for border_y in range(height - 2):
@@ -181,20 +285,41 @@ def draw_border(width, height):
     echo('╝', width - 1, height - 1)
 
 
-# Draw the board, including pieces and colored squares
-def draw_board(highlighted_squares, piece_list):
+# Draw a single square of the board, remembering what was drawn so that it can be skipped until it changes
+# The cursor movement and colored text for each square are cached, since they only depend on its position and contents
+def draw_square(x, y, background_color, icon):
+    cell = (background_color, icon)
+    prev_cells[x][y] = cell
+    cell_text = cell_text_cache.get(cell)
+    if cell_text is None:
+        cell_text = cell_text_cache[cell] = background_color(' ' + icon + ' ')
+    output_buffer.append(square_locations[x][y] + cell_text)
+
+
+# At the start of the game, draw the empty checkerboard pattern that never changes
+# Afterwards, only squares with a highlight or a piece (or that just lost one) need to be drawn
+def draw_base_board():
     for x in range(BOARD_WIDTH):
         for y in range(BOARD_HEIGHT):
-            background_color = square_bg_white if is_sum_odd(x, y) else square_bg_gray
-            for highlight_color in highlighted_squares.keys():
-                if (x, y) in highlighted_squares[highlight_color]:
-                    background_color = highlight_color
-            piece = get_piece_at((x, y), piece_list)
-            if piece is not None:
-                icon = piece.get_icon()
-                echo(background_color(' ' + icon + ' '), x * 3 + 2, y + 1)
-            else:
-                echo(background_color('   '), x * 3 + 2, y + 1)
+            draw_square(x, y, base_cell_bg[x][y], ' ')
+
+
+# Draw the board, including colored squares and, if draw_pieces is set, the pieces
+# cell_bg is a grid of the background color each square should be drawn with
+# Only squares whose color or icon changed since the last frame are redrawn
+def draw_board(cell_bg, draw_pieces):
+    for x in range(BOARD_WIDTH):
+        # Look up each column once instead of on every iteration of the inner loop
+        bg_column = cell_bg[x]
+        board_column = board[x]
+        prev_column = prev_cells[x]
+        for y in range(BOARD_HEIGHT):
+            background_color = bg_column[y]
+            piece = board_column[y] if draw_pieces else None
+            icon = piece.get_icon() if piece is not None else ' '
+
+            if (background_color, icon) != prev_column[y]:
+                draw_square(x, y, background_color, icon)
 
 
 # Depending on the state of the game, print the actions available to the player
@@ -213,6 +338,7 @@ def print_available_inputs(state):
 
 
 # Every time the user presses a valid key on the keyboard, perform a function based on the game's current state
+# Returns True if the key changed the state of the game, meaning the display needs to be updated
 def update_inputs(last_key):
     global selected_square
     global game_state
@@ -222,6 +348,7 @@ def update_inputs(last_key):
     # If the main menu is active, start the game as soon as a key is pressed.
     if game_state == State.MAIN_MENU:
         game_state = State.SELECT_PIECE
+        return True
 
     # If the game is in its default state:
     # Calculate the direction to move the selection based on the user's inputs
@@ -230,12 +357,15 @@ def update_inputs(last_key):
         # Key codes: left = 260, up = 259, down = 258, right = 261
         move_h = (last_key.code == 261) - (last_key.code == 260)
         move_v = (last_key.code == 258) - (last_key.code == 259)
+        prev_selected_square = selected_square
         selected_square = ((selected_square[0] + move_h) % BOARD_WIDTH, (selected_square[1] + move_v) % BOARD_HEIGHT)
 
-        if last_key == 'z' and get_piece_at(selected_square, pieces) in get_available_pieces(active_player):
+        if last_key == 'z' and get_piece_at(selected_square) in get_available_pieces(active_player):
             game_state = State.MOVE_PIECE
             selected_action_idx = 0
-            return
+            return True
+
+        return selected_square != prev_selected_square
 
     # If a piece has been chosen:
     # Cancel the piece selection and return to the default state if the player presses the 'x' key
@@ -243,16 +373,17 @@ def update_inputs(last_key):
     # If the user presses the 'z' key, execute the selected move, removing any piece that was jumped over and ending
     # the game if necessary
     elif game_state == State.MOVE_PIECE:
-        selected_piece = get_piece_at(selected_square, pieces)
+        selected_piece = get_piece_at(selected_square)
 
         if last_key == 'x':
             game_state = State.SELECT_PIECE
             update_inputs(last_key)
-            return
+            return True
 
         cycle = (last_key.code == 261) - (last_key.code == 260)
         # Get the total number of possible moves OR jumps (works because the two lists are mutually exclusive)
         total_num_actions = len(selected_piece.possible_moves) + len(selected_piece.possible_jumps)
+        prev_selected_action_idx = selected_action_idx
         selected_action_idx = (selected_action_idx + cycle) % total_num_actions
 
         if last_key == 'z':
@@ -261,96 +392,95 @@ def update_inputs(last_key):
             if len(selected_piece.possible_jumps) > 0:
                 # Move the selected piece, and find and remove the one that was jumped over
                 sel_action = selected_piece.possible_jumps[selected_action_idx]
-                pieces.remove(get_piece_at((sel_action[0] + pos[0], sel_action[1] + pos[1]), pieces))
-                selected_piece.pos = (sel_action[0] * 2 + pos[0], sel_action[1] * 2 + pos[1])
+                jumped_pos = (sel_action[0] + pos[0], sel_action[1] + pos[1])
+                capture_piece(get_piece_at(jumped_pos))
+                move_piece(selected_piece, (sel_action[0] * 2 + pos[0], sel_action[1] * 2 + pos[1]))
 
-                reset_piece_actions()
+                reset_piece_actions_near([pos, jumped_pos, selected_piece.pos])
 
                 # End the game if the opponent has no remaining pieces they can move
                 if len(get_available_pieces(Team.BLACK if active_player == Team.WHITE else Team.WHITE)) == 0:
                     game_state = State.GAME_OVER
-                    return
+                    return True
 
                 # Enter a jump chain if another jump can be performed by the same piece
                 if len(selected_piece.possible_jumps) > 0:
-                    selected_piece.in_jump_chain = True
+                    set_in_jump_chain(selected_piece, True)
                     selected_square = selected_piece.pos
                     game_state = State.SELECT_PIECE
-                    return
+                    return True
                 else:
-                    selected_piece.in_jump_chain = False
+                    set_in_jump_chain(selected_piece, False)
             else:
                 # For regular moves, simply move the piece and reset the available piece actions
                 sel_action = selected_piece.possible_moves[selected_action_idx]
-                selected_piece.pos = (sel_action[0] + pos[0], sel_action[1] + pos[1])
-                reset_piece_actions()
+                move_piece(selected_piece, (sel_action[0] + pos[0], sel_action[1] + pos[1]))
+                reset_piece_actions_near([pos, selected_piece.pos])
 
             # If the move didn't result in a jump chain or the end of the game, return to the DEFAULT state and begin
             # the opponent's turn
             selected_square = selected_piece.pos
             game_state = State.SELECT_PIECE
             active_player = Team.BLACK if active_player == Team.WHITE else Team.WHITE
-            return
+            return True
 
-    elif game_state == State.GAME_OVER:
-        pass
+        return selected_action_idx != prev_selected_action_idx
 
+    # Once the game is over, no key changes anything
+    return False
 
-# Update the variables used to display the board, including lists of which pieces should be highlighted which color
-# The display will change based on the game's current state
-def update_display():
-    # Key: the terminal color the squares should be highlighted with
-    # Value: a list of squares to be highlighted with that color
-    # Colors are drawn in the order of the keys, first to last
-    highlighted_squares = {
-        square_bg_highlighted_y: [],
-        square_bg_highlighted_r: [],
-        square_bg_highlighted_g: [],
-        square_bg_dimmed: [],
-    }
 
+# Get a grid of the background color each square should be drawn with, based on the game's current state
+def get_cell_bg():
     # If the game is on the main menu, dim the white squares
+    # The main menu never changes, so its colors are prepared in advance
     if game_state == State.MAIN_MENU:
-        # This list comprehension is based on a StackOverflow solution:
-        # https://stackoverflow.com/questions/3633140/nested-for-loops-using-list-comprehension
-        highlighted_squares[square_bg_dimmed] = [(x, y) for x in range(0, 8) for y in range(0, 8) if is_sum_odd(x, y)]
+        cell_bg = main_menu_cell_bg
+    else:
+        # The background color of each square, starting from a copy of the regular checkerboard pattern
+        # Highlights are assigned in order of precedence, so later assignments take priority over earlier ones
+        cell_bg = [column[:] for column in base_cell_bg]
 
     # If the game is in its default state:
     # Highlight any pieces that have jumps available with yellow
     # Highlight the currently selected square green if it contains a movable piece, otherwise highlight it red
-    elif game_state == State.SELECT_PIECE:
-        selected_piece = get_piece_at(selected_square, pieces)
+    if game_state == State.SELECT_PIECE:
+        selected_piece = get_piece_at(selected_square)
         jump_pieces = get_jump_pieces(active_player)
         movable_pieces = get_available_pieces(active_player)
 
+        for piece in jump_pieces:
+            cell_bg[piece.pos[0]][piece.pos[1]] = square_bg_highlighted_y
         selection_hl_color = square_bg_highlighted_g if selected_piece in movable_pieces else square_bg_highlighted_r
-        highlighted_squares[selection_hl_color] = [selected_square]
-        highlighted_squares[square_bg_highlighted_y] = [piece.pos for piece in jump_pieces]
+        cell_bg[selected_square[0]][selected_square[1]] = selection_hl_color
 
     # If a piece has been chosen:
     # Dim the square containing the selected piece
     # Highlight the currently selected move green, and all other available moves yellow
     # If there are jumps available, highlight any pieces that will be eliminated red
     elif game_state == State.MOVE_PIECE:
-        selected_piece = get_piece_at(selected_square, pieces)
+        selected_piece = get_piece_at(selected_square)
         pos = selected_piece.pos
         if len(selected_piece.possible_jumps) > 0:
             for i, action in enumerate(selected_piece.possible_jumps):
                 target_color = square_bg_highlighted_g if i == selected_action_idx else square_bg_highlighted_y
-                highlighted_squares[target_color].append((action[0] * 2 + pos[0], action[1] * 2 + pos[1]))
-
-            highlighted_squares[square_bg_highlighted_r] = [
-                (action[0] + pos[0], action[1] + pos[1]) for action in selected_piece.possible_jumps
-            ]
+                cell_bg[action[0] * 2 + pos[0]][action[1] * 2 + pos[1]] = target_color
+                cell_bg[action[0] + pos[0]][action[1] + pos[1]] = square_bg_highlighted_r
         else:
             for i, action in enumerate(selected_piece.possible_moves):
                 target_color = square_bg_highlighted_g if i == selected_action_idx else square_bg_highlighted_y
-                highlighted_squares[target_color].append((action[0] + pos[0], action[1] + pos[1]))
+                cell_bg[action[0] + pos[0]][action[1] + pos[1]] = target_color
+
+        cell_bg[pos[0]][pos[1]] = square_bg_dimmed
 
-        highlighted_squares[square_bg_dimmed] = [pos]
+    return cell_bg
 
+
+# Update the variables used to display the board, including the color each square should be highlighted with
+# The display will change based on the game's current state
+def update_display():
     # Draw the board and print information on the available inputs and game state
-    draw_board(highlighted_squares, [] if game_state == State.MAIN_MENU else pieces)
+    draw_board(get_cell_bg(), game_state != State.MAIN_MENU)
     print_available_inputs(game_state)
     if game_state == State.MAIN_MENU:
         echo(term.clear_eol + "Welcome to CHECKERS!", 0, 0, add_margin=False)
@@ -358,10 +488,30 @@ def update_display():
         echo(term.clear_eol + active_player.name + " wins!", 0, 0, add_margin=False)
     else:
         echo(term.clear_eol + active_player.name + "'s turn...", 0, 0, add_margin=False)
+    flush_output()
 
 
 # A list containing every piece currently in play
 pieces = []
+# The squares next to each square on the board, precomputed by build_square_neighbors
+square_neighbors = build_square_neighbors()
+# The pieces currently in play, split up by the team they belong to
+team_pieces = {Team.WHITE: [], Team.BLACK: []}
+# Bitboards of the squares occupied by each team's pieces, where the bit for (x, y) is set if the square is occupied
+team_bitboards = {Team.WHITE: 0, Team.BLACK: 0}
+# Key: a team
+# Value: the cached result of get_jump_pieces for that team
+jump_pieces_cache = {}
+# A grid mapping each (x, y) coordinate on the board to the piece occupying it, or None if the square is empty
+board = [[None] * BOARD_HEIGHT for _ in range(BOARD_WIDTH)]
+# A grid of the (background color, icon) last drawn to each square, or None if the square must be redrawn
+prev_cells = [[None] * BOARD_HEIGHT for _ in range(BOARD_WIDTH)]
+# A grid of the escape sequences that move the cursor to each square of the board
+square_locations = [[term.move_xy(x * 3 + 2, y + 1 + BOARD_MARGIN) for y in range(BOARD_HEIGHT)]
+                    for x in range(BOARD_WIDTH)]
+# Key: a (background color, icon) pair
+# Value: the colored text drawn for a square with that background color and icon
+cell_text_cache = {}
 
 if __name__ == '__main__':
     # Instantiate the pieces at the correct locations
@@ -380,10 +530,24 @@ if __name__ == '__main__':
         # Clear the screen and draw a border
         print(term.home + term.clear)
         draw_border(BOARD_WIDTH * 3 + 4, BOARD_HEIGHT + 2)
+        draw_base_board()
+        flush_output()
 
         # Start the game loop
+        update_display()
         key_press = ''
         while key_press != 'q':
-            update_display()
             key_press = term.inkey()
-            update_inputs(key_press)
+            # If more keys arrived in the same burst (e.g. a held arrow key), handle them all before redrawing, so that
+            # intermediate states are never drawn
+            state_changed = False
+            while key_press != 'q':
+                next_key_press = term.inkey(timeout=0)
+                if not next_key_press:
+                    break
+                state_changed = update_inputs(key_press) or state_changed
+                key_press = next_key_press
+            state_changed = update_inputs(key_press) or state_changed
+            # Skip redrawing entirely if none of the keys did anything
+            if state_changed:
+                update_display()